@@ -1,20 +1,36 @@
+import os
+
+# Tesseract's internal OpenMP threads only add overhead for single images - OCR
+# scales with worker processes instead. Must be set before tesserocr is imported
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
 from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
-from PIL import Image
-import pytesseract
-import io
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from tesserocr import PyTessBaseAPI, PSM, OEM
 import re
+import asyncio
 import json
-import os
-import requests
+try:
+    # orjson decodes large JSON-LD blocks several times faster than json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+import httpx
+from cachetools import LRUCache, TTLCache
 import logging
-import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from bs4 import BeautifulSoup
+import soupsieve as sv
 from urllib.parse import urlparse
 import cv2
 import numpy as np
+from io import BytesIO
+from PIL import Image, UnidentifiedImageError
+from itertools import chain
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +48,12 @@ class RecipeResponse(BaseModel):
     recipeName: Optional[str] = None  # Added recipe name field
     error: Optional[str] = None
 
+# Lightweight parsing result - only converted to Ingredient at the API boundary
+class ParsedIngredient(NamedTuple):
+    name: str
+    amount: str
+    unit: str
+
 # Enhanced Danish-specific corrections and mappings
 DANISH_CORRECTIONS = {
     'ræsk': 'græsk',
@@ -75,10 +97,10 @@ DANISH_UNITS = {
 }
 
 # Special Danish units that should NEVER be converted
-SPECIAL_DANISH_UNITS = {
+SPECIAL_DANISH_UNITS = frozenset({
     'fed', 'håndfuld', 'håndfulde', 'knivspids', 'pind', 'pose', 'bundt', 
     'bundle', 'neve', 'klat', 'skive', 'klump'
-}
+})
 
 # More conservative ingredient core mapping - only very specific cases
 INGREDIENT_CORE_MAPPING = {
@@ -88,25 +110,144 @@ INGREDIENT_CORE_MAPPING = {
     'tomater': ['hakkede tomater', 'cherry tomater', 'cocktail tomater']
 }
 
+# Reverse index of INGREDIENT_CORE_MAPPING: variation -> core ingredient
+INGREDIENT_VARIATIONS = {
+    variation: core_ingredient
+    for core_ingredient, variations in INGREDIENT_CORE_MAPPING.items()
+    for variation in variations
+}
+
 # Words that should never be considered ingredients
-NON_INGREDIENT_WORDS = {
+NON_INGREDIENT_WORDS = frozenset({
     'styrke', 'mere', 'mindre', 'efter', 'smag', 'behov', 'ønske', 'cirka', 'ca',
     'evt', 'eventuelt', 'til', 'som', 'eller', 'og', 'af', 'med', 'uden', 'for',
     'servering', 'pynt', 'garnering', 'side', 'ekstra', 'let', 'god', 'fin', 'stor', 'lille'
+})
+
+# Preparation terms stripped from ingredient names (descriptive words are kept)
+PREPARATION_TERMS = [
+    'finthakkede', 'fintrevet', 'hakket', 'finsnittet', 'opskåret', 'skårne', 'skåret',
+    'delte', 'opdelte', 'smuldret', 'fintsnittet', 'groftrevet', 'kogte', 'ristede',
+    'sautéede', 'opvarmede', 'grillede', 'stegte', 'blancherede', 'røget',
+    'skrællede', 'rensede', 'pressede', 'finthakket', 'grofthakket'
+]
+
+# Precompiled pattern for ingredient parsing. Amount (fractions, ranges and
+# question marks), unit and name are picked out in a single match from the
+# start of the line. Units are sorted by length descending to match longer
+# units first (e.g., "håndfulde" before "håndfuld")
+ALL_UNITS = frozenset(DANISH_UNITS.keys()) | frozenset(DANISH_UNITS.values()) | SPECIAL_DANISH_UNITS
+INGREDIENT_LINE_RE = re.compile(
+    r'(?:(?P<amount>\d+(?:[.,/]\d+)?(?:\s*-\s*\d+(?:[.,/]\d+)?)?|[?½¼¾])\s*)?'
+    r'(?:(?P<unit>' + '|'.join(sorted(ALL_UNITS, key=len, reverse=True)) + r')\b\s*)?'
+    r'(?P<name>.*)',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Only very specific instruction patterns are removed from ingredient names
+INSTRUCTION_PATTERNS = [
+    re.compile(r',?\s*(saft og .*skal.*)', re.IGNORECASE),  # "saft og fintrevet skal heraf"
+    re.compile(r',?\s*(kun saften)', re.IGNORECASE),        # "kun saften"
+    re.compile(r'\(.*?\)', re.IGNORECASE),                  # Remove parenthetical content
+]
+PREPARATION_RE = re.compile(r'\b(' + '|'.join(PREPARATION_TERMS) + r')\b', re.IGNORECASE)
+TRAILING_PUNCTUATION_RE = re.compile(r'[,.-]+$')
+LEADING_PUNCTUATION_RE = re.compile(r'^[,.-]+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Lines containing any of these are treated as instructions, not ingredients
+INSTRUCTION_INDICATORS = ['bland', 'tilsæt', 'hæld', 'kog', 'steg', 'varm', 'server', 'rør', 'kom']
+INSTRUCTION_INDICATOR_RE = re.compile('|'.join(map(re.escape, INSTRUCTION_INDICATORS)), re.IGNORECASE)
+
+# Any letter, including æ, ø and å
+LETTER_RE = re.compile(r'[^\W\d_]')
+
+# Recipe-specific title selectors, in priority order
+RECIPE_TITLE_SELECTORS = [
+    '.recipe-title',
+    '.recipe-header h1',
+    '.recipe-name',
+    '.entry-title',
+    '.post-title',
+    '.recipe__title',
+    '.wprm-recipe-name',
+    '.opskrift-titel',
+    'h1.recipe',
+    '[itemprop="name"]'
+]
+
+# Common ingredient container selectors, in priority order
+INGREDIENT_SELECTORS = [
+    '.recipe-ingredients',
+    '.ingredients-list',
+    '.ingredient-list',
+    '.ingredients',
+    '[itemprop="recipeIngredient"]',
+    '.recipe__ingredients',
+    '.opskrift-ingredienser',
+    '.ingredient-group',
+    '.recipe-ingredients__list',
+    '.ingredienser',
+    # WP Recipe Maker specific selectors
+    '.wprm-recipe-ingredient',
+    '.wprm-recipe-ingredients',
+    # Add more selectors as needed
+]
+
+# Selectors compiled once instead of being parsed again for every page
+COMPILED_RECIPE_TITLE_SELECTORS = [(selector, sv.compile(selector)) for selector in RECIPE_TITLE_SELECTORS]
+COMPILED_INGREDIENT_SELECTORS = [(selector, sv.compile(selector)) for selector in INGREDIENT_SELECTORS]
+ANY_INGREDIENT_SELECTOR = sv.compile(', '.join(INGREDIENT_SELECTORS))
+
+# Site name suffixes stripped from page titles, e.g. " - Site Name" and " | Site Name"
+TITLE_SUFFIX_PATTERNS = [
+    re.compile(r'\s*[-|–]\s*.*$'),
+    re.compile(r'\s*\|\s*.*$'),
+]
+
+# OCR runs in a pool of worker processes, each holding its own warm Tesseract
+# engine, so images are recognized in parallel. The pool is created on startup
+# and tess_api is only set inside the workers. Every worker loads the whole app
+# and the Danish model (~100 MB), so the count is set per deployment rather
+# than taken from os.cpu_count(), which reports the host's cores in a container
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 1))
+ocr_pool: Optional[ProcessPoolExecutor] = None
+tess_api: Optional[PyTessBaseAPI] = None
+
+# Images with a longer side than this are downscaled before OCR
+MAX_OCR_DIMENSION = 2000
+
+# Reduced-size decode modes, largest reduction first. JPEGs are scaled down
+# inside the decoder, so the full-size image is never built
+REDUCED_GRAYSCALE_MODES = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+]
+
+# Headers sent when fetching recipe pages
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Charset': 'utf-8'
 }
 
-# Find Tesseract executable by checking common locations
-tesseract_cmd = 'tesseract'  # Default to just the command name
-for path in ['/usr/bin/tesseract', '/usr/local/bin/tesseract', 'tesseract']:
-    try:
-        subprocess.run([path, '--version'], capture_output=True, check=True)
-        tesseract_cmd = path
-        break
-    except (subprocess.SubprocessError, FileNotFoundError):
-        continue
+# Shared async HTTP client so recipe fetches don't block the event loop and
+# reuse TCP and TLS connections (HTTP/2 where supported). Created on startup
+http_client: Optional[httpx.AsyncClient] = None
+
+# Parsed recipes by URL: (etag, last_modified, ingredients, recipe_title).
+# Only used from the event loop, so no lock is needed
+recipe_cache = LRUCache(maxsize=512)
 
-# Configure pytesseract
-pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+# Recently parsed recipes by URL: (ingredients, recipe_title). Repeat requests
+# (refreshes, retries) within the TTL skip the network entirely - kept short so
+# edits to a recipe still show up quickly through the revalidation above
+recent_recipes = TTLCache(maxsize=1024, ttl=300)
+
+# Recipe pages larger than this are rejected instead of parsed - real recipe
+# pages are well below it, and parse time grows with page size
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
 
 # Create FastAPI app
 app = FastAPI()
@@ -124,24 +265,170 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def preprocess_image(image: Image.Image) -> Image.Image:
+@app.on_event("startup")
+def start_http_client():
+    """
+    Create the shared HTTP client used to fetch recipe pages
+    """
+    global http_client
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        follow_redirects=True,
+        headers=REQUEST_HEADERS,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    )
+
+@app.on_event("shutdown")
+async def stop_http_client():
+    """
+    Close the shared HTTP client and its pooled connections
     """
-    Preprocess image to improve OCR accuracy
+    if http_client:
+        await http_client.aclose()
+
+def create_ocr_pool() -> ProcessPoolExecutor:
     """
-    # Convert PIL Image to OpenCV format
-    opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    Create a pool of OCR_WORKERS OCR worker processes and start them warming up
+    """
+    pool = ProcessPoolExecutor(
+        max_workers=OCR_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_ocr_worker
+    )
     
-    # Convert to grayscale
-    gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+    # Workers are only spawned when work arrives, so start all of them now -
+    # loading the Danish model then happens when the pool is created instead
+    # of on the first uploads. This starts exactly OCR_WORKERS processes, so
+    # keep that within the instance's memory. The tasks are not awaited, so
+    # startup is not held up
+    for _ in range(OCR_WORKERS):
+        pool.submit(warm_ocr_worker)
     
-    # Apply thresholding to get black and white image
-    _, binary = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return pool
+
+@app.on_event("startup")
+def start_ocr_pool():
+    """
+    Start the OCR worker processes
+    """
+    global ocr_pool
+    ocr_pool = create_ocr_pool()
+
+def restart_ocr_pool(broken_pool: ProcessPoolExecutor):
+    """
+    Replace an OCR pool that lost a worker, which leaves it unusable for good
+    """
+    global ocr_pool
+    # Pages of one request fail together, so only the first of them replaces the pool
+    if ocr_pool is not broken_pool:
+        return
     
-    # Remove noise
-    denoised = cv2.fastNlMeansDenoising(binary)
+    logger.warning("OCR worker died, restarting the OCR pool")
+    broken_pool.shutdown(wait=False)
+    ocr_pool = create_ocr_pool()
+
+async def run_ocr(contents: bytes) -> List[ParsedIngredient]:
+    """
+    OCR and parse an uploaded image in the OCR worker pool
+    """
+    pool = ocr_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, ocr_ingredients, contents)
+    except BrokenProcessPool:
+        # A worker was killed (e.g. out of memory) or crashed. This request
+        # fails, but later ones get a fresh pool
+        restart_ocr_pool(pool)
+        raise
+
+@app.on_event("shutdown")
+def stop_ocr_pool():
+    """
+    Shut down the OCR worker processes
+    """
+    if ocr_pool:
+        ocr_pool.shutdown()
+
+def preprocess_image(gray: np.ndarray) -> np.ndarray:
+    """
+    Preprocess a grayscale image to improve OCR accuracy
+    Returns a single-channel uint8 array
+    """
+    # Shrink very large images so the longer side is MAX_OCR_DIMENSION - OCR
+    # gets much slower above that with no gain in accuracy
+    scale = MAX_OCR_DIMENSION / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    # Smooth out sensor noise before thresholding so it is not binarized into specks
+    gray = cv2.medianBlur(gray, 3)
     
-    # Convert back to PIL Image
-    return Image.fromarray(denoised)
+    # Adaptive thresholding handles uneven lighting in a single pass. The
+    # result is already binary, so Tesseract skips its own thresholding
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+def init_ocr_worker():
+    """
+    Load the Tesseract engine with the Danish model once per OCR worker process
+    """
+    global tess_api
+    tess_api = PyTessBaseAPI(lang='dan', oem=OEM.DEFAULT, psm=PSM.SINGLE_BLOCK)
+    tess_api.SetVariable('preserve_interword_spaces', '1')
+    
+    # Run a blank image through the engine so everything it loads lazily is
+    # loaded before the first real image
+    extract_text(np.full((32, 32), 255, np.uint8))
+
+def warm_ocr_worker():
+    """
+    No-op task used to get an OCR worker process started
+    """
+
+def extract_text(image: np.ndarray) -> str:
+    """
+    Run OCR on a grayscale image using the worker's Tesseract engine
+    """
+    # Hand Tesseract the raw pixels instead of letting it re-encode a PIL image
+    height, width = image.shape
+    tess_api.SetImageBytes(image.tobytes(), width, height, 1, width)
+    return tess_api.GetUTF8Text()
+
+def grayscale_decode_mode(contents: bytes) -> int:
+    """
+    Pick the cheapest grayscale decode mode that still leaves the image at
+    least MAX_OCR_DIMENSION on its longer side
+    """
+    # Only the header is read here, the pixels are not decoded
+    try:
+        with Image.open(BytesIO(contents)) as image:
+            longest_side = max(image.size)
+    except (UnidentifiedImageError, OSError):
+        return cv2.IMREAD_GRAYSCALE
+    
+    for factor, mode in REDUCED_GRAYSCALE_MODES:
+        if longest_side // factor >= MAX_OCR_DIMENSION:
+            return mode
+    return cv2.IMREAD_GRAYSCALE
+
+def ocr_image(contents: bytes) -> str:
+    """
+    Decode, preprocess and OCR an uploaded image inside an OCR worker
+    """
+    # Decode straight to 8-bit grayscale in one step, without a PIL image or
+    # a color copy in between. Large photos are decoded at reduced size since
+    # preprocessing would shrink them anyway
+    gray = cv2.imdecode(np.frombuffer(contents, np.uint8), grayscale_decode_mode(contents))
+    if gray is None:
+        raise ValueError("Could not decode image")
+    
+    return extract_text(preprocess_image(gray))
+
+def ocr_ingredients(contents: bytes) -> List[ParsedIngredient]:
+    """
+    OCR an uploaded image and parse its ingredients inside an OCR worker
+    """
+    return parse_ingredients_from_text(ocr_image(contents))
 
 def clean_danish_text(text: str) -> str:
     """
@@ -173,30 +460,16 @@ def clean_ingredient_name(raw_name: str) -> str:
     clean_name = raw_name.lower().strip()
     
     # Only remove very specific instruction patterns
-    specific_patterns = [
-        r',?\s*(saft og .*skal.*)',     # "saft og fintrevet skal heraf"
-        r',?\s*(kun saften)',           # "kun saften"
-        r'\(.*?\)',                     # Remove parenthetical content
-    ]
-    
-    for pattern in specific_patterns:
-        clean_name = re.sub(pattern, '', clean_name, flags=re.IGNORECASE)
+    for pattern in INSTRUCTION_PATTERNS:
+        clean_name = pattern.sub('', clean_name)
     
     # Only remove clear preparation terms, not descriptive words
-    prep_terms = [
-        'finthakkede', 'fintrevet', 'hakket', 'finsnittet', 'opskåret', 'skårne', 'skåret',
-        'delte', 'opdelte', 'smuldret', 'fintsnittet', 'groftrevet', 'kogte', 'ristede',
-        'sautéede', 'opvarmede', 'grillede', 'stegte', 'blancherede', 'røget',
-        'skrællede', 'rensede', 'pressede', 'finthakket', 'grofthakket'
-    ]
-    
-    prep_pattern = r'\b(' + '|'.join(prep_terms) + r')\b'
-    clean_name = re.sub(prep_pattern, '', clean_name, flags=re.IGNORECASE)
+    clean_name = PREPARATION_RE.sub('', clean_name)
     
     # Clean up punctuation and spaces
-    clean_name = re.sub(r'[,.-]+$', '', clean_name)  # Remove trailing punctuation
-    clean_name = re.sub(r'^[,.-]+', '', clean_name)  # Remove leading punctuation
-    clean_name = re.sub(r'\s+', ' ', clean_name)     # Normalize spaces
+    clean_name = TRAILING_PUNCTUATION_RE.sub('', clean_name)  # Remove trailing punctuation
+    clean_name = LEADING_PUNCTUATION_RE.sub('', clean_name)   # Remove leading punctuation
+    clean_name = WHITESPACE_RE.sub(' ', clean_name)           # Normalize spaces
     clean_name = clean_name.strip()
     
     # Check if it's a non-ingredient word
@@ -204,9 +477,9 @@ def clean_ingredient_name(raw_name: str) -> str:
         return None  # Don't return non-ingredients
     
     # Only map very specific cases, preserve most original names
-    for core_ingredient, variations in INGREDIENT_CORE_MAPPING.items():
-        if clean_name in variations:
-            return core_ingredient
+    core_ingredient = INGREDIENT_VARIATIONS.get(clean_name)
+    if core_ingredient:
+        return core_ingredient
     
     # Return the cleaned name as-is (don't extract "last word")
     return clean_name if clean_name else None
@@ -227,7 +500,7 @@ def normalize_unit(unit: str) -> str:
     # Only convert standard abbreviations
     return DANISH_UNITS.get(unit_lower, unit_lower)
 
-def parse_ingredient_text(text: str) -> Optional[Ingredient]:
+def parse_ingredient_text(text: str) -> Optional[ParsedIngredient]:
     """
     Enhanced ingredient parsing that preserves special Danish units
     """
@@ -235,29 +508,12 @@ def parse_ingredient_text(text: str) -> Optional[Ingredient]:
     if not text:
         return None
     
-    # Extract amount (handle fractions, ranges, and question marks)
-    amount_pattern = r'^(\d+(?:[.,/]\d+)?(?:\s*-\s*\d+(?:[.,/]\d+)?)?|\?|\d+\s*½|\d+\s*¼|\d+\s*¾|½|¼|¾)'
-    amount_match = re.search(amount_pattern, text)
-    
-    amount = '?'
-    remaining_text = text
-    
-    if amount_match:
-        amount = amount_match.group(1)
-        remaining_text = text[amount_match.end():].strip()
-    
-    # Extract unit - be very careful with special units
-    all_units = list(DANISH_UNITS.keys()) + list(DANISH_UNITS.values()) + list(SPECIAL_DANISH_UNITS)
-    # Sort by length descending to match longer units first (e.g., "håndfulde" before "håndfuld")
-    unit_pattern = r'^(' + '|'.join(sorted(all_units, key=len, reverse=True)) + r')\b'
-    unit_match = re.search(unit_pattern, remaining_text, re.IGNORECASE)
-    
-    unit = ''
-    ingredient_text = remaining_text
-    
-    if unit_match:
-        unit = normalize_unit(unit_match.group(1))
-        ingredient_text = remaining_text[unit_match.end():].strip()
+    # Split the line into amount, unit and name in one pass - every part is
+    # optional, so this always matches
+    match = INGREDIENT_LINE_RE.match(text)
+    amount = match.group('amount') or '?'
+    unit = normalize_unit(match.group('unit') or '')
+    ingredient_text = match.group('name')
     
     # Clean the ingredient name
     ingredient_name = clean_ingredient_name(ingredient_text)
@@ -265,13 +521,13 @@ def parse_ingredient_text(text: str) -> Optional[Ingredient]:
     if not ingredient_name:
         return None
     
-    return Ingredient(
+    return ParsedIngredient(
         name=ingredient_name,
         amount=amount,
         unit=unit
     )
 
-def parse_ingredients_from_text(text: str) -> List[Ingredient]:
+def parse_ingredients_from_text(text: str) -> List[ParsedIngredient]:
     """
     Parse multiple ingredients from text with improved cleaning
     """
@@ -283,67 +539,90 @@ def parse_ingredients_from_text(text: str) -> List[Ingredient]:
         if not line or len(line) < 3:
             continue
         
+        # Skip lines without any letters (page numbers, times, stray OCR marks) -
+        # they can never produce an ingredient name
+        if not LETTER_RE.search(line):
+            continue
+        
         # Skip lines that are clearly instructions (too long or contain instruction words)
-        instruction_indicators = ['bland', 'tilsæt', 'hæld', 'kog', 'steg', 'varm', 'server', 'rør', 'kom']
-        if (len(line.split()) > 10 or 
-            any(indicator in line.lower() for indicator in instruction_indicators)):
+        if len(line.split()) > 10 or INSTRUCTION_INDICATOR_RE.search(line):
             continue
         
         parsed = parse_ingredient_text(line)
         if parsed and parsed.name:  # Only add if we have a valid name
             ingredients.append(parsed)
     
-    # Deduplicate ingredients by name and unit
-    unique_ingredients = []
-    seen = set()
+    return deduplicate_ingredients(ingredients)
+
+def deduplicate_ingredients(ingredients: Iterable[ParsedIngredient]) -> List[ParsedIngredient]:
+    """
+    Deduplicate ingredients by name and unit, keeping the first occurrence
+    """
+    unique_ingredients = {}
     
     for ingredient in ingredients:
-        key = f"{ingredient.name.lower()}_{ingredient.unit.lower()}"
-        if key not in seen:
-            seen.add(key)
-            unique_ingredients.append(ingredient)
+        key = (ingredient.name.lower(), ingredient.unit.lower())
+        if key not in unique_ingredients:
+            unique_ingredients[key] = ingredient
         else:
             logger.info(f"Skipping duplicate ingredient: {ingredient.name} ({ingredient.unit})")
     
-    return unique_ingredients
+    return list(unique_ingredients.values())
 
-def extract_recipe_title(soup: BeautifulSoup) -> Optional[str]:
+def find_jsonld_recipes(soup: BeautifulSoup) -> List[dict]:
     """
-    Extract recipe title from HTML using multiple strategies
+    Find all JSON-LD Recipe objects on the page, in page order
     """
-    # Strategy 1: Look for JSON-LD structured data first
+    recipes = []
     script_tags = soup.find_all('script', {'type': 'application/ld+json'})
     for script in script_tags:
+        if not script.string:
+            continue
+        
+        # orjson only accepts exact str/bytes, not BeautifulSoup's str subclasses
+        # (its JSONDecodeError subclasses json.JSONDecodeError)
         try:
-            data = json.loads(script.string)
-            if isinstance(data, dict) and '@type' in data and data['@type'] == 'Recipe':
-                title = data.get('name')
-                if title and isinstance(title, str) and len(title.strip()) > 3:
-                    return title.strip()
-        except (json.JSONDecodeError, AttributeError):
+            data = json_loads(str(script.string))
+        except json.JSONDecodeError:
             continue
+        
+        recipes.extend(find_recipe_nodes(data))
     
-    # Strategy 2: Look for recipe-specific title selectors
-    recipe_title_selectors = [
-        '.recipe-title',
-        '.recipe-header h1',
-        '.recipe-name',
-        '.entry-title',
-        '.post-title',
-        '.recipe__title',
-        '.wprm-recipe-name',
-        '.opskrift-titel',
-        'h1.recipe',
-        '[itemprop="name"]'
-    ]
+    return recipes
+
+def find_recipe_nodes(data) -> Iterator[dict]:
+    """
+    Find Recipe objects in decoded JSON-LD, including arrays and @graph wrappers
+    """
+    if isinstance(data, list):
+        for item in data:
+            yield from find_recipe_nodes(item)
+    elif isinstance(data, dict):
+        node_type = data.get('@type')
+        if node_type == 'Recipe' or (isinstance(node_type, list) and 'Recipe' in node_type):
+            yield data
+        elif '@graph' in data:
+            yield from find_recipe_nodes(data['@graph'])
+
+def extract_recipe_title(soup: BeautifulSoup, recipes: Sequence[dict] = ()) -> Optional[str]:
+    """
+    Extract recipe title from HTML using multiple strategies
+    recipes are the page's JSON-LD Recipe objects, if it has any
+    """
+    # Strategy 1: Use JSON-LD structured data first
+    for recipe_data in recipes:
+        title = recipe_data.get('name')
+        if title and isinstance(title, str) and len(title.strip()) > 3:
+            return title.strip()
     
-    for selector in recipe_title_selectors:
-        elements = soup.select(selector)
+    # Strategy 2: Look for recipe-specific title selectors
+    for selector, compiled_selector in COMPILED_RECIPE_TITLE_SELECTORS:
+        elements = compiled_selector.select(soup)
         for element in elements:
             title = element.get_text(strip=True)
             if title and len(title) > 3 and len(title) < 200:  # Reasonable title length
                 # Clean the title
-                title = re.sub(r'\s+', ' ', title)  # Normalize whitespace
+                title = WHITESPACE_RE.sub(' ', title)  # Normalize whitespace
                 title = title.strip()
                 if title:
                     logger.info(f"Found recipe title using selector '{selector}': {title}")
@@ -366,8 +645,8 @@ def extract_recipe_title(soup: BeautifulSoup) -> Optional[str]:
         title = title_tag.get_text(strip=True)
         if title and len(title) > 3:
             # Clean up common title patterns
-            title = re.sub(r'\s*[-|–]\s*.*$', '', title)  # Remove " - Site Name" parts
-            title = re.sub(r'\s*\|\s*.*$', '', title)     # Remove " | Site Name" parts
+            for pattern in TITLE_SUFFIX_PATTERNS:
+                title = pattern.sub('', title)
             title = title.strip()
             if len(title) > 3 and len(title) < 200:
                 logger.info(f"Using cleaned page title: {title}")
@@ -376,57 +655,120 @@ def extract_recipe_title(soup: BeautifulSoup) -> Optional[str]:
     logger.info("Could not find recipe title")
     return None
 
-def extract_recipe_data(url: str) -> tuple[List[Ingredient], Optional[str]]:
+async def extract_recipe_data(url: str) -> tuple[List[ParsedIngredient], Optional[str]]:
     """
     Extract recipe data and title from URL
     Returns: (ingredients, recipe_title)
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Charset': 'utf-8'
-        }
+        # Pages parsed within the last few minutes are returned without any request
+        recent = recent_recipes.get(url)
+        if recent:
+            return recent
         
-        response = requests.get(url, headers=headers)
-        response.encoding = response.apparent_encoding
+        headers = {}
         
-        soup = BeautifulSoup(response.text, 'html.parser', from_encoding='utf-8')
+        # Revalidate a previously parsed page instead of downloading it again
+        cached = recipe_cache.get(url)
+        if cached:
+            etag, last_modified, _, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
         
-        # Extract recipe title first
-        recipe_title = extract_recipe_title(soup)
-        
-        # Try different methods to find ingredients
-        ingredients = []
-        
-        # Method 1: Try to find JSON-LD structured data
-        script_tags = soup.find_all('script', {'type': 'application/ld+json'})
-        for script in script_tags:
-            try:
-                data = json.loads(script.string)
-                if isinstance(data, dict) and '@type' in data and data['@type'] == 'Recipe':
-                    ingredients = parse_jsonld_ingredients(data)
-                    if ingredients:
-                        return ingredients, recipe_title
-            except (json.JSONDecodeError, AttributeError):
-                continue
+        async with http_client.stream('GET', url, headers=headers) as response:
+            if cached and response.status_code == 304:
+                logger.info(f"Recipe page not modified, using cached result: {url}")
+                recent_recipes[url] = (cached[2], cached[3])
+                return cached[2], cached[3]
+            
+            html = await read_recipe_page(response)
         
-        # Method 2: Look for common recipe ingredient patterns  
-        ingredient_elements = find_ingredient_elements(soup)
-        if ingredient_elements:
-            ingredients = parse_html_ingredients(ingredient_elements)
-            if ingredients:
-                return ingredients, recipe_title
+        # Parsing is CPU-bound, so keep it off the event loop
+        ingredients, recipe_title = await asyncio.to_thread(
+            parse_recipe_page, html, response.charset_encoding
+        )
         
-        # Method 3: Fall back to generic list parsing
-        ingredients = parse_generic_lists(soup)
+        # Error pages (e.g. a transient 503) must not be served again from the
+        # caches, and only pages with validators can be revalidated later
+        if response.is_success:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                recipe_cache[url] = (etag, last_modified, ingredients, recipe_title)
+            recent_recipes[url] = (ingredients, recipe_title)
         
         return ingredients, recipe_title
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error extracting recipe data: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to parse recipe: {str(e)}")
 
-def parse_jsonld_ingredients(data: dict) -> List[Ingredient]:
+async def read_recipe_page(response: httpx.Response) -> bytes:
+    """
+    Read the body of a streamed recipe page, rejecting anything that is not
+    HTML or is larger than MAX_PAGE_BYTES
+    """
+    # A missing Content-Type is allowed - only pages that say they are something else are rejected
+    content_type = response.headers.get('Content-Type', '').lower()
+    if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+        raise HTTPException(status_code=415, detail=f"Not an HTML page: {content_type}")
+    
+    # Reject pages that announce their size up front without reading them
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit() and int(content_length) > MAX_PAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Recipe page is too large")
+    
+    # Otherwise stop reading as soon as the limit is passed
+    body = bytearray()
+    async for chunk in response.aiter_bytes():
+        body += chunk
+        if len(body) > MAX_PAGE_BYTES:
+            raise HTTPException(status_code=413, detail="Recipe page is too large")
+    
+    return bytes(body)
+
+def parse_recipe_page(html: bytes, encoding: Optional[str] = None) -> tuple[List[ParsedIngredient], Optional[str]]:
+    """
+    Extract ingredients and title from a recipe page
+    Returns: (ingredients, recipe_title)
+    """
+    # Give the parser the raw bytes with the charset from the Content-Type
+    # header. Without one (or if it fails to decode) the page's declared
+    # charset is used, so charset detection over the whole body is a last resort
+    soup = BeautifulSoup(html, 'lxml', from_encoding=encoding)
+    
+    # Decode the JSON-LD structured data once for both title and ingredients
+    recipes = find_jsonld_recipes(soup)
+    
+    # Extract recipe title first
+    recipe_title = extract_recipe_title(soup, recipes)
+    
+    # Try different methods to find ingredients
+    ingredients = []
+    
+    # Method 1: Use JSON-LD structured data, from the first Recipe that lists any
+    for recipe_data in recipes:
+        ingredients = parse_jsonld_ingredients(recipe_data)
+        if ingredients:
+            return ingredients, recipe_title
+    
+    # Method 2: Look for common recipe ingredient patterns  
+    ingredient_elements = find_ingredient_elements(soup)
+    if ingredient_elements:
+        ingredients = parse_html_ingredients(ingredient_elements)
+        if ingredients:
+            return ingredients, recipe_title
+    
+    # Method 3: Fall back to generic list parsing
+    ingredients = parse_generic_lists(soup)
+    
+    return ingredients, recipe_title
+
+def parse_jsonld_ingredients(data: dict) -> List[ParsedIngredient]:
     """
     Parse ingredients from JSON-LD data
     """
@@ -434,6 +776,10 @@ def parse_jsonld_ingredients(data: dict) -> List[Ingredient]:
     raw_ingredients = data.get('recipeIngredient', [])
     
     for raw in raw_ingredients:
+        # Some pages ship null or numeric entries - skip them rather than fail the page
+        if not isinstance(raw, str):
+            continue
+        
         parsed = parse_ingredient_text(raw)
         if parsed:
             ingredients.append(parsed)
@@ -444,32 +790,21 @@ def find_ingredient_elements(soup: BeautifulSoup) -> List:
     """
     Find ingredient elements in HTML using common selectors
     """
-    possible_selectors = [
-        '.recipe-ingredients',
-        '.ingredients-list',
-        '.ingredient-list',
-        '.ingredients',
-        '[itemprop="recipeIngredient"]',
-        '.recipe__ingredients',
-        '.opskrift-ingredienser',
-        '.ingredient-group',
-        '.recipe-ingredients__list',
-        '.ingredienser',
-        # WP Recipe Maker specific selectors
-        '.wprm-recipe-ingredient',
-        '.wprm-recipe-ingredients',
-        # Add more selectors as needed
-    ]
+    # Walk the tree once for all selectors, then keep the matches of the
+    # first selector in priority order that matched anything
+    candidates = ANY_INGREDIENT_SELECTOR.select(soup)
+    if not candidates:
+        return []
     
-    for selector in possible_selectors:
-        elements = soup.select(selector)
+    for selector, compiled_selector in COMPILED_INGREDIENT_SELECTORS:
+        elements = [element for element in candidates if compiled_selector.match(element)]
         if elements:
             logger.info(f"Found ingredients using selector: {selector}")
             return elements
     
     return []
 
-def parse_html_ingredients(elements: List) -> List[Ingredient]:
+def parse_html_ingredients(elements: List) -> List[ParsedIngredient]:
     """
     Parse ingredients from HTML elements
     """
@@ -490,7 +825,7 @@ def parse_html_ingredients(elements: List) -> List[Ingredient]:
     
     return ingredients
 
-def parse_generic_lists(soup: BeautifulSoup) -> List[Ingredient]:
+def parse_generic_lists(soup: BeautifulSoup) -> List[ParsedIngredient]:
     """
     Parse ingredients from generic list items
     """
@@ -504,6 +839,16 @@ def parse_generic_lists(soup: BeautifulSoup) -> List[Ingredient]:
     
     return ingredients
 
+def to_response_ingredients(ingredients: List[ParsedIngredient]) -> List[Ingredient]:
+    """
+    Convert parsed ingredients to response models, skipping validation
+    since the parser only produces strings
+    """
+    return [
+        Ingredient.model_construct(name=ingredient.name, amount=ingredient.amount, unit=ingredient.unit)
+        for ingredient in ingredients
+    ]
+
 @app.post("/parse-image", response_model=RecipeResponse)
 async def parse_image(file: UploadFile = File(...)):
     """
@@ -511,37 +856,58 @@ async def parse_image(file: UploadFile = File(...)):
     """
     try:
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
         
-        # Preprocess the image
-        processed_image = preprocess_image(image)
+        # Decode, preprocess, OCR and parse the image in the OCR worker pool. The
+        # encoded upload is sent across instead of much larger pixel arrays, and
+        # the line parsing stays off the event loop
+        ingredients = await run_ocr(contents)
         
-        # Configure Tesseract for better accuracy
-        custom_config = r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
-        extracted_text = pytesseract.image_to_string(
-            processed_image,
-            lang='dan',
-            config=custom_config
+        if not ingredients:
+            return RecipeResponse(
+                ingredients=[],
+                success=False,
+                error="Kunne ikke finde ingredienser i billedet"
+            )
+        
+        return RecipeResponse(
+            ingredients=to_response_ingredients(ingredients),
+            success=True,
+            recipeName=None  # No recipe name from images
         )
         
-        # Parse ingredients from the extracted text
-        ingredients = parse_ingredients_from_text(extracted_text)
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/parse-images", response_model=RecipeResponse)
+async def parse_images(files: List[UploadFile] = File(...)):
+    """
+    Parse ingredients from several uploaded images, e.g. the pages of one recipe
+    """
+    try:
+        contents = [await file.read() for file in files]
+        
+        # OCR and parse all pages at once - pages are spread over the OCR workers
+        page_ingredients = await asyncio.gather(*(run_ocr(page) for page in contents))
+        
+        # Merge the pages so ingredients repeated across pages are deduplicated
+        ingredients = deduplicate_ingredients(chain.from_iterable(page_ingredients))
         
         if not ingredients:
             return RecipeResponse(
                 ingredients=[],
                 success=False,
-                error="Kunne ikke finde ingredienser i billedet"
+                error="Kunne ikke finde ingredienser i billederne"
             )
         
         return RecipeResponse(
-            ingredients=ingredients,
+            ingredients=to_response_ingredients(ingredients),
             success=True,
             recipeName=None  # No recipe name from images
         )
         
     except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
+        logger.error(f"Error processing images: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/parse-url", response_model=RecipeResponse)
@@ -550,7 +916,7 @@ async def parse_url(url: str = Query(...)):
     Parse ingredients and recipe name from a recipe URL
     """
     try:
-        ingredients, recipe_title = extract_recipe_data(url)
+        ingredients, recipe_title = await extract_recipe_data(url)
         
         if not ingredients:
             return RecipeResponse(
@@ -561,11 +927,13 @@ async def parse_url(url: str = Query(...)):
             )
         
         return RecipeResponse(
-            ingredients=ingredients,
+            ingredients=to_response_ingredients(ingredients),
             recipeName=recipe_title,  # Include the extracted recipe title
             success=True
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing URL: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -594,7 +962,7 @@ async def test_parsing():
         parsed = parse_ingredient_text(ingredient_text)
         results.append({
             "original": ingredient_text,
-            "parsed": parsed.dict() if parsed else None
+            "parsed": parsed._asdict() if parsed else None
         })
     
     return {"test_results": results}
@@ -606,13 +974,10 @@ async def test_title_extraction(url: str = Query(...)):
     Test endpoint to verify title extraction
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = await http_client.get(url)
+        soup = BeautifulSoup(response.content, 'lxml', from_encoding=response.charset_encoding)
         
-        title = extract_recipe_title(soup)
+        title = extract_recipe_title(soup, find_jsonld_recipes(soup))
         
         return {
             "url": url,